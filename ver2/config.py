@@ -2,8 +2,12 @@ import numpy as np
 from pathlib import Path
 
 MAX_MESSAGE_LENGTH = 32
+LOG_INITIAL_CAPACITY = 1 << 16 # начальная ёмкость хранилища сообщений
+DECODE_CACHE_SIZE = 1 << 16 # сколько уникальных сообщений помнит кэш декодера
 DATA_DIR = Path("data") # Папка, где лежат логи
 DEFAULT_LOG_EXTENSION = ".t4433" # Расширение файлов логов
+READ_BUFFER_SIZE = 1 << 20 # Размер блока при чтении файла (байт)
+MIN_DT = 2.0 # Минимальный шаг между точками рядов высоты, трека, скорости, курса и разности высот (вместе с ней и ГНСС высоты), сек; 0 - хранить все
 
 # словарь для преобразования режимов автопилота в понятные сокращения
 MODE_MAP = {
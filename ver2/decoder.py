@@ -1,203 +1,412 @@
+from functools import lru_cache
+import math
+import re
 import numpy as np
 import pyModeS as pms
-from config import MAX_MESSAGE_LENGTH, MODE_MAP
+from config import MAX_MESSAGE_LENGTH, LOG_INITIAL_CAPACITY, MODE_MAP, DECODE_CACHE_SIZE
+from utils import iter_text_blocks
 
-# класс-контейнер для одного ads-b сообщения
-class ADSBMessage:
-    def __init__(self):
-        self.timestamp = np.float64(0.0)
-        self.message = np.zeros(MAX_MESSAGE_LENGTH, dtype=np.uint8)
-        self.message_length = 0
+# колоночное хранилище сообщений одного файла (отдельный массив на каждое поле)
+class ADSBLog:
+    def __init__(self, capacity=LOG_INITIAL_CAPACITY):
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.messages = np.zeros((capacity, MAX_MESSAGE_LENGTH), dtype=np.uint8)
+        self.lengths = np.zeros(capacity, dtype=np.int32)
+        self.dfs = np.zeros(capacity, dtype=np.uint8)
+        self.tcs = np.zeros(capacity, dtype=np.uint8)
+        self.oes = np.zeros(capacity, dtype=np.uint8)
+        self.count = 0
 
-# функция парсит одну строку из файла с данными
+    def __len__(self):
+        return self.count
+
+    # увеличиваем ёмкость массивов вдвое, когда место закончилось
+    def _grow(self):
+        capacity = len(self.timestamps) * 2
+        self.timestamps = np.resize(self.timestamps, capacity)
+        self.messages = np.resize(self.messages, (capacity, MAX_MESSAGE_LENGTH))
+        self.lengths = np.resize(self.lengths, capacity)
+        self.dfs = np.resize(self.dfs, capacity)
+        self.tcs = np.resize(self.tcs, capacity)
+        self.oes = np.resize(self.oes, capacity)
+
+    # добавляет блок уже декодированных сообщений и возвращает индекс первого из них.
+    # DF и TC всего блока вычисляются сдвигами над массивом байтов, как в pms.df
+    # (первые 5 бит, не больше 24) и pms.adsb.typecode (первые 5 бит 5-го байта),
+    # признак чёт/нечет CPR - как pms.adsb.oe_flag (бит 54 сообщения, 7-й байт)
+    def extend(self, timestamps, payload, lengths):
+        n = len(timestamps)
+        while self.count + n > len(self.timestamps):
+            self._grow()
+        first = self.count
+        rows = slice(first, first + n)
+        self.timestamps[rows] = timestamps
+        self.messages[rows] = payload
+        self.lengths[rows] = lengths
+        self.dfs[rows] = np.minimum(payload[:, 0] >> 3, 24)
+        self.tcs[rows] = payload[:, 4] >> 3
+        self.oes[rows] = (payload[:, 6] >> 2) & 1
+        self.count += n
+        return first
+
+# функция разбирает одну строку из файла с данными на время (текстом) и сообщение.
+# Строка уже приведена к верхнему регистру при чтении блока (iter_text_blocks)
 def parse_ads_b_line(line):
     # делим строку на части по пробелам
-    parts = line.strip().split()
+    parts = line.split()
     if len(parts) < 2:
         return None
-    try:
-        # первую часть превращаем в число (время)
-        timestamp = np.float64(parts[0])
-    except ValueError:
-        return None
     
     # проверка формата: если есть колонка DF/UF, смещаем чтение hex
-    if len(parts) >= 3 and parts[1].upper() in ['DF', 'UF']:
+    if len(parts) >= 3 and parts[1] in ('DF', 'UF'):
         hex_parts = parts[2:]
     else:
         hex_parts = parts[1:]
     
-    # остальные части соединяем в сплошную hex-строку
-    message_spaced = ' '.join(hex_parts).upper().strip()
-    message_str = message_spaced.replace(" ", "")
+    # остальные части сразу соединяем в сплошную hex-строку
+    message_str = ''.join(hex_parts)
     
-    if len(message_str) == 0 or not all(c in "0123456789ABCDEF" for c in message_str):
+    if len(message_str) == 0:
         return None
-    
-    # создаём объект-контейнер и заполняем его байтами
-    msg = ADSBMessage()
-    msg.timestamp = timestamp
-    try:
-        bytes_list = [int(message_str[i:i + 2], 16) for i in range(0, len(message_str), 2)]
-        msg.message_length = min(len(bytes_list), MAX_MESSAGE_LENGTH)
-        for i in range(msg.message_length):
-            msg.message[i] = np.uint8(bytes_list[i])
-    except:
-        return None
-        
-    return msg, message_spaced, message_str
 
-# универсальная функция извлечения высоты 
-def get_altitude_any_df(msg_str, df):
-    try:
-        # если это ADS-B (DF17/18)
-        if df in [17, 18]:
-            tc = pms.adsb.typecode(msg_str)
-            if 9 <= tc <= 18:
-                return pms.adsb.altitude(msg_str)
-        # если это Mode S ELS (DF0, 4, 16, 20)
-        elif df in [0, 4, 16, 20]:
-            return pms.common.altcode(msg_str)
-    except:
-        return None
-    return None
+    return parts[0], message_str
 
-# получение Squawk (кода ответчика)
-def get_squawk(msg_str, df):
-    try:
-        # работает для DF5 и DF21
-        if df in [5, 21]:
-            return pms.common.idcode(msg_str)
-    except:
-        return None
-    return None
+# таблица перевода ascii-кода в значение полубайта (0xFF - не hex-символ)
+HEX_LUT = np.full(256, 0xFF, dtype=np.uint8)
+HEX_LUT[np.frombuffer(b"0123456789", dtype=np.uint8)] = np.arange(10)
+HEX_LUT[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(10, 16)
 
-# функция извлекает скорость из сообщения
-def get_velocity(msg_str):
-    try:
-        # проверяем, что это ads-b сообщение
-        df = pms.df(msg_str)
-        if df not in [17, 18]: return None
-        # проверяем, что это сообщение о скорости (тип 19)
-        tc = pms.adsb.typecode(msg_str)
-        if tc == 19:
-            result = pms.adsb.velocity(msg_str)
-            if result and result[0] is not None:
-                return result[0]
-        return None
-    except:
-        return None
+# функция переводит список hex-строк в массив байтов (n, MAX_MESSAGE_LENGTH) за один проход
+def hex_to_u8(messages):
+    width = 2 * MAX_MESSAGE_LENGTH
+    lengths = np.fromiter(map(len, messages), dtype=np.int32, count=len(messages))
+    # все строки дополняем нулями до одной ширины и склеиваем в один буфер
+    buf = "".join(m[:width].ljust(width, "0") for m in messages).encode("ascii", errors="replace")
+    nibbles = HEX_LUT[np.frombuffer(buf, dtype=np.uint8)].reshape(len(messages), width)
+    # строка корректна, если в ней только hex-символы и их чётное число
+    valid = (nibbles != 0xFF).all(axis=1) & (lengths % 2 == 0)
+    # хвост слишком длинных сообщений в таблицу не попал, проверяем его отдельно
+    for i in np.flatnonzero(lengths > width):
+        try:
+            bytes.fromhex(messages[i])
+        except ValueError:
+            valid[i] = False
+    payload = (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+    return payload, np.minimum(lengths // 2, MAX_MESSAGE_LENGTH), valid
 
-# функция извлекает курс из сообщения
-def get_course(msg_str):
-    try:
-        # проверяем, что это ads-b сообщение
-        df = pms.df(msg_str)
-        if df not in [17, 18]: return None
-        # также проверяем, что это сообщение о скорости (тип 19)
-        tc = pms.adsb.typecode(msg_str)
-        if tc == 19:
-            _, heading, _, _ = pms.adsb.velocity(msg_str)
-            return heading
-        return None
-    except:
-        return None
+# шаблон обычной строки лога: время, необязательная колонка DF/UF и hex-группы через один пробел.
+# Все остальные непустые строки попадают в третью группу и разбираются по одной (parse_ads_b_line)
+LINE_PATTERN = re.compile(r'^(?:(\S+) (?:[DU]F )?([0-9A-F]+(?: [0-9A-F]+)*)|(.+))$', re.M)
 
-# функция извлекает выбранную на автопилоте высоту и режимы
-def get_selected_altitude(msg_str):
+# адрес борта (6 hex-символов) в виде 3 байтов для фильтра по массиву сообщений.
+# Адрес, который не совпадёт ни с одним сообщением, даёт (-1, -1, -1)
+def address_filter(icao):
     try:
-        # проверяем, что это ads-b сообщение
-        df = pms.df(msg_str)
-        if df not in [17, 18]: return None
-        # проверяем, что это сообщение о статусе (тип 29)
-        tc = pms.adsb.typecode(msg_str)
-        if tc != 29: return None
-        sel_alt_info = pms.adsb.selected_altitude(msg_str)
-        if sel_alt_info is None: return None
-        selected_alt, raw_modes = sel_alt_info
-        if selected_alt is not None and -2000 <= selected_alt <= 50000:
-            # переводим режимы в понятные сокращения
-            processed_modes = {MODE_MAP.get(m, m) for m in raw_modes}
-            return selected_alt, processed_modes
-        return None
-    except Exception as e:
-        return None
+        address = bytes.fromhex(icao) if len(icao) == 6 else b""
+    except ValueError:
+        address = b""
+    if len(address) != 3:
+        return np.full(3, -1, dtype=np.int16)
+    return np.frombuffer(address, dtype=np.uint8).astype(np.int16)
+
+# функция парсит блок текста и добавляет все сообщения в log одной операцией.
+# Строки блока разбираются одним вызовом регулярного выражения, а не split/join на каждую строку.
+# target - адрес из address_filter: сообщения других бортов с открытым адресом в лог не попадают
+def parse_ads_b_block(text, log, target=None):
+    # время и hex собираются в два отдельных столбца
+    times, messages = [], []
+    for ts, message_spaced, other in LINE_PATTERN.findall(text):
+        if other:
+            p = parse_ads_b_line(other)
+            if p is None:
+                continue
+            ts, message_str = p
+        else:
+            message_str = message_spaced.replace(" ", "")
+        times.append(ts)
+        messages.append(message_str)
+    if not messages:
+        return []
 
-# функция получения разности высот
-def get_altitude_difference(msg_str):
+    # hex всех строк блока декодируем и проверяем одной операцией над массивом
+    payload, lengths, valid = hex_to_u8(messages)
+
+    # фильтр по борту сразу по байтам адреса (DF11/17/18 передают его открыто);
+    # адрес остальных DF восстанавливается из CRC, их проверяет вызывающий код
+    if target is not None:
+        dfs = np.minimum(payload[:, 0] >> 3, 24)
+        valid &= ~(DF_CLEAR_ADDRESS_ARRAY[dfs] & (payload[:, 1:4] != target).any(axis=1))
+
+    # время всех строк блока переводим в числа одним вызовом numpy
     try:
-        # проверяем, что это ads-b сообщение
-        df = pms.df(msg_str)
-        if df not in [17, 18]: return None
-        # проверяем, что это сообщение о скорости (тип 19)
-        tc = pms.typecode(msg_str)
-        if tc != 19:
-            return None
-        
-        altitude_diff = pms.adsb.altitude_diff(msg_str)
-        if altitude_diff is not None and -2500 <= altitude_diff <= 2500:
-            return altitude_diff
-        
-        return None
-    except Exception as e:
-        return None
+        timestamps = np.array(times, dtype=np.float64)
+    except ValueError:
+        # в блоке есть строка с испорченным временем, разбираем по одной
+        timestamps = np.zeros(len(times), dtype=np.float64)
+        for i, ts in enumerate(times):
+            try:
+                timestamps[i] = np.float64(ts)
+            except ValueError:
+                valid[i] = False
+
+    if not valid.all():
+        messages = [m for m, ok in zip(messages, valid) if ok]
+        timestamps, payload, lengths = timestamps[valid], payload[valid], lengths[valid]
+        if not messages:
+            return []
+
+    first = log.extend(timestamps, payload, lengths)
+    rows = slice(first, first + len(messages))
+    return list(zip(range(first, first + len(messages)), messages, log.dfs[rows].tolist(), log.tcs[rows].tolist()))
+
+# генератор всех сообщений файла: (индекс в log, hex, DF, TC).
+# Если задан target_icao, сообщения других бортов с открытым адресом пропускаются
+def read_ads_b_file(path, log, target_icao=None):
+    target = address_filter(target_icao) if target_icao else None
+    for text in iter_text_blocks(path):
+        yield from parse_ads_b_block(text, log, target)
+
+# Функции ниже декодируют одно поле сообщения. Проверку DF и TC они не делают:
+# их вызывает decode_message только для подходящих сообщений.
+
+# высота из ADS-B сообщения о положении в воздухе (TC 9-18). Сюда попадают только
+# высоты в коде Гиллхема (Q-бит = 0): остальные считает altitude_batch
+def get_adsb_altitude(msg_str):
+    return pms.adsb.altitude(msg_str)
+
+# высота из Mode S ELS (DF0, 4, 16, 20)
+def get_els_altitude(msg_str):
+    return pms.common.altcode(msg_str)
+
+# получение Squawk (кода ответчика), DF5 и DF21
+def get_squawk(msg_str):
+    return pms.common.idcode(msg_str)
+
+# функция извлекает выбранную на автопилоте высоту и режимы (TC 29)
+def get_selected_altitude(msg_str):
+    sel_alt_info = pms.adsb.selected_altitude(msg_str)
+    if sel_alt_info is None: return None
+    selected_alt, raw_modes = sel_alt_info
+    if selected_alt is not None and -2000 <= selected_alt <= 50000:
+        # переводим режимы в понятные сокращения
+        processed_modes = {MODE_MAP.get(m, m) for m in raw_modes}
+        return selected_alt, processed_modes
+    return None
 
-# функция получения барокоррекции
+# функция получения барокоррекции (TC 29)
 def get_baro_correction(msg_str):
-    try:
-        # проверяем, что это ads-b сообщение
-        df = pms.df(msg_str)
-        if df not in [17, 18]: return None
-        # проверяем, что это сообщение о статусе (тип 29)
-        tc = pms.adsb.typecode(msg_str)
-        if tc != 29:
-            return None
-        
-        baro_setting = pms.adsb.baro_pressure_setting(msg_str)
-        
-        if baro_setting is not None:
-            # разумные пределы для атмосферного давления
-            if 800 <= baro_setting <= 1100:
-                return baro_setting
-                
-        return None
-        
-    except Exception as e:
-        return None
+    baro_setting = pms.adsb.baro_pressure_setting(msg_str)
+    # разумные пределы для атмосферного давления
+    if baro_setting is not None and 800 <= baro_setting <= 1100:
+        return baro_setting
+    return None
+
+# байты, которые удаляются из позывного (всё, кроме букв и цифр)
+CALLSIGN_DELETE = bytes(b for b in range(256) if not chr(b).isalnum())
 
-# функция извлекает позывной (callsign)
+# функция извлекает позывной (callsign), TC 1-4
 def get_callsign(msg_str):
-    try:
-        # проверяем, что это ads-b сообщение
-        df = pms.df(msg_str)
-        if df not in [17, 18]: return None
-        # проверяем, что это сообщение идентификации (тип 1-4)
-        tc = pms.adsb.typecode(msg_str)
-        if 1 <= tc <= 4:
-            callsign = pms.adsb.callsign(msg_str)
-            if not callsign: return None
-            # очищаем позывной от лишних символов
-            return ''.join(c for c in callsign if c.isalnum())
-        return None
-    except:
-        return None
+    callsign = pms.adsb.callsign(msg_str)
+    if not callsign: return None
+    # очищаем позывной от лишних символов (алфавит pyModeS - только ascii)
+    return callsign.encode('ascii', 'ignore').translate(None, CALLSIGN_DELETE).decode('ascii')
 
-# вспомогательная функция для генерации метки формата сообщения
-def get_format_label(msg_str, df):
-    
-    if df in [0, 4, 5, 11]:
-        length_type = "S"
-    elif df in [16, 17, 18, 19, 20, 21, 24]:
-        length_type = "L"
+# таблицы признаков по номеру DF (pms.df возвращает значения 0-24);
+# обращение по индексу вместо создания списка и поиска в нём на каждое сообщение
+DF_IS_ADSB = [df in (17, 18) for df in range(32)]
+
+# форматы, в которых адрес борта передаётся открытым текстом (байты 2-4)
+DF_CLEAR_ADDRESS = [df in (11, 17, 18) for df in range(32)]
+
+# маска ADS-B форматов для битовой маски принятых DF (бит номер df)
+ADSB_DF_MASK = (1 << 17) | (1 << 18)
+
+# длина сообщения по DF: S - короткое (56 бит), L - длинное (112 бит), ? - неизвестно
+DF_LENGTH_LUT = ['S' if df in (0, 4, 5, 11) else 'L' if df in (16, 17, 18, 19, 20, 21, 24) else '?'
+                 for df in range(32)]
+
+# длина по числу hex-символов (других длин у сообщений Mode S нет)
+HEX_LENGTH_TYPE = {14: 'S', 28: 'L'}
+
+# категория ADS-B сообщения по TC (0-31): одно обращение по индексу вместо цепочки сравнений
+TC_CATEGORY = ['position' if 9 <= tc <= 18 else 'velocity' if tc == 19 else 'ident' if 1 <= tc <= 4
+               else 'status' if tc == 29 else None for tc in range(32)]
+
+# те же таблицы в виде массивов numpy, для классификации всего лога сразу
+DF_IS_ADSB_ARRAY = np.array(DF_IS_ADSB)
+DF_CLEAR_ADDRESS_ARRAY = np.array(DF_CLEAR_ADDRESS)
+TC_CATEGORY_ARRAY = np.array([category or '' for category in TC_CATEGORY])
+
+# Mode S форматы с высотой и с кодом Squawk (см. DF_DECODERS)
+ALT_DFS = (0, 4, 16, 20)
+SQUAWK_DFS = (5, 21)
+
+# длины сообщений стандартного размера в байтах (56 и 112 бит)
+STANDARD_BYTE_LENGTHS = (7, 14)
+
+# функция делит все сообщения лога на фазы обработки по столбцам DF/TC.
+# Возвращает {фаза: список индексов в log по порядку файла}; одно сообщение
+# может попасть в несколько фаз (ADS-B TC 9-18 даёт и высоту, и координаты)
+def split_phases(log):
+    n = len(log)
+    dfs, tcs = log.dfs[:n], log.tcs[:n]
+    # у сообщений нестандартной длины decode_message полей не возвращает
+    standard = np.isin(log.lengths[:n], STANDARD_BYTE_LENGTHS)
+    category = np.where(standard & DF_IS_ADSB_ARRAY[dfs], TC_CATEGORY_ARRAY[tcs], '')
+    position = category == 'position'
+    return {
+        'alt': np.flatnonzero(np.isin(dfs, ALT_DFS) | position).tolist(),
+        'squawk': np.flatnonzero(np.isin(dfs, SQUAWK_DFS)).tolist(),
+        'position': np.flatnonzero(position).tolist(),
+        'velocity': np.flatnonzero(category == 'velocity').tolist(),
+        'ident': np.flatnonzero(category == 'ident').tolist(),
+        'status': np.flatnonzero(category == 'status').tolist(),
+    }
+
+# Пакетное декодирование частых полей (высота, скорость, курс, разность высот) сразу
+# для всех сообщений фазы: целочисленные сдвиги над столбцами ADSBLog по формулам pyModeS,
+# без перевода сообщений в строки из '0' и '1'. Значение, которого в сообщении нет, - NaN
+
+# поле ME (байты 5-11) сообщений rows лога одним массивом int64 (56 бит)
+def me_field(log, rows):
+    me = np.zeros(len(rows), dtype=np.int64)
+    for byte in log.messages[rows, 4:11].astype(np.int64).T:
+        me = (me << 8) | byte
+    return me
+
+# допустимый диапазон высоты (футы): значения вне его считаются ошибкой приёма
+ALTITUDE_RANGE = (-2000, 60000)
+
+# высота сообщений фазы 'alt': ADS-B о положении (TC 9-18) и Mode S DF0/4/16/20
+# (13-битный код высоты AC, как pms.common.altcode), сразу с проверкой диапазона.
+# Возвращает (высоты, scalar): NaN - высоты нет или она вне диапазона;
+# scalar - высота в коде Гиллхема, её считает pyModeS по одному сообщению (decode_message)
+def altitude_batch(log, rows):
+    dfs = log.dfs[rows]
+    adsb = DF_IS_ADSB_ARRAY[dfs]
+    standard = np.isin(log.lengths[rows], STANDARD_BYTE_LENGTHS)
+
+    # ADS-B: 12 бит ME 9-20, Q-бит = 1 - шаг 25 футов
+    altbin = (me_field(log, rows) >> 36) & 0xFFF
+    adsb_q = (altbin & 0x10) != 0
+    adsb_alt = (((altbin >> 5) << 4) | (altbin & 0xF)) * 25 - 1000
+
+    # Mode S: код AC - последние 13 бит первых 4 байтов (биты сообщения 20-32)
+    head = log.messages[rows, :4].astype(np.int64)
+    code = ((head[:, 2] << 8) | head[:, 3]) & 0x1FFF
+    m_bit = (code >> 6) & 1
+    q_bit = (code >> 4) & 1
+    # M = 0, Q = 1: 11 бит без M и Q, шаг 25 футов; M = 1: 12 бит без M, в метрах
+    feet = (((code >> 7) << 5) | (((code >> 5) & 1) << 4) | (code & 0xF)) * 25 - 1000
+    meters = np.floor((((code >> 7) << 6) | (code & 0x3F)) * 3.28084)
+    ac_alt = np.where(m_bit == 1, meters, feet)
+    ac_valid = (code != 0) & ((m_bit == 1) | (q_bit == 1))
+
+    alts = np.where(adsb, adsb_alt, ac_alt).astype(np.float64)
+    valid = standard & np.where(adsb, adsb_q, ac_valid)
+    low, high = ALTITUDE_RANGE
+    alts[~(valid & (alts >= low) & (alts <= high))] = np.nan
+
+    # код Гиллхема: ADS-B с Q = 0 и Mode S с M = 0, Q = 0 (код не нулевой)
+    gillham = np.where(adsb, ~adsb_q, (code != 0) & (m_bit == 0) & (q_bit == 0))
+    return alts, standard & gillham
+
+# скорость, курс (или направление) и разность высот сообщений о скорости (TC 19)
+def velocity_batch(log, rows):
+    me = me_field(log, rows)
+    subtype = (me >> 48) & 0x7
+    field_1 = (me >> 32) & 0x3FF # биты ME 14-23
+    field_2 = (me >> 21) & 0x3FF # биты ME 25-34
+    bit_13 = (me >> 42) & 1
+    bit_24 = (me >> 31) & 1
+
+    # путевая скорость из составляющих восток-запад и север-юг (подтипы 1, 2)
+    ground = (subtype == 1) | (subtype == 2)
+    factor = np.where(subtype == 2, 4, 1)
+    v_we = np.where(bit_13, -1, 1) * (field_1 - 1) * factor
+    v_sn = np.where(bit_24, -1, 1) * (field_2 - 1) * factor
+    ground_valid = (field_1 != 0) & (field_2 != 0)
+    gs = np.floor(np.sqrt(v_sn * v_sn + v_we * v_we))
+    # atan2 берётся из math, как в pyModeS: np.arctan2 иногда расходится с ним в последнем знаке
+    trk = np.degrees(np.fromiter(map(math.atan2, v_we.tolist(), v_sn.tolist()), dtype=np.float64, count=len(me)))
+    trk = np.where(trk >= 0, trk, trk + 360)
+
+    # воздушная скорость и магнитный курс (подтипы 3, 4)
+    airspeed = (field_2 - 1) * np.where(subtype == 4, 4, 1)
+    hdg = field_1 / 1024 * 360.0
+
+    speed = np.where(ground, np.where(ground_valid, gs, np.nan),
+                     np.where(field_2 != 0, airspeed, np.nan))
+    course = np.where(ground, np.where(ground_valid, trk, np.nan),
+                      np.where(bit_13 == 1, hdg, np.nan))
+
+    # разность высот ГНСС и барометрической
+    value = me & 0x7F
+    alt_diff = np.where((me >> 7) & 1, -1, 1) * (value - 1) * 25
+    diff_valid = (value != 0) & (value != 127) & (np.abs(alt_diff) <= 2500)
+    return speed, course, np.where(diff_valid, alt_diff, np.nan)
+
+# какие поля декодировать для Mode S сообщений, по DF
+DF_DECODERS = {
+    0: [('alt', get_els_altitude)],
+    4: [('alt', get_els_altitude)],
+    16: [('alt', get_els_altitude)],
+    20: [('alt', get_els_altitude)],
+    5: [('squawk', get_squawk)],
+    21: [('squawk', get_squawk)],
+}
+
+# какие поля декодировать для ADS-B сообщений (DF17/18), по TC
+TC_DECODERS = {
+    **{tc: [('callsign', get_callsign)] for tc in range(1, 5)},
+    **{tc: [('alt', get_adsb_altitude)] for tc in range(9, 19)},
+    29: [('sel_alt', get_selected_altitude), ('baro', get_baro_correction)],
+}
+
+# ICAO адрес сообщения; одинаковые сообщения в логе повторяются часто,
+# поэтому результат кэшируется по hex-строке
+@lru_cache(maxsize=DECODE_CACHE_SIZE)
+def get_icao(msg_str):
+    return pms.icao(msg_str)
+
+# ICAO адрес при уже известном DF: в DF11/17/18 адрес передаётся открыто
+# в байтах 2-4, его достаточно вырезать из строки (как и делает pms.icao).
+# Для остальных DF адрес восстанавливается по CRC в get_icao
+def fast_icao(msg_str, df):
+    if DF_CLEAR_ADDRESS[df]:
+        return msg_str[2:8]
+    return get_icao(msg_str)
+
+# функция декодирует сообщение один раз: DF и TC уже посчитаны для всего блока (ADSBLog),
+# нужные поля выбираются по таблицам DF_DECODERS / TC_DECODERS.
+# Сообщения нестандартной длины отбрасываются сразу: именно на них pyModeS
+# и падает, поэтому отдельные try/except вокруг каждого поля не нужны.
+# Ошибку декодера на сообщении правильной длины получит вызывающий код.
+# Результат кэшируется, поэтому возвращаемый словарь менять нельзя
+@lru_cache(maxsize=DECODE_CACHE_SIZE)
+def decode_message(msg_str, df, tc):
+    features = {'df': df}
+    if len(msg_str) not in HEX_LENGTH_TYPE:
+        return features
+
+    if DF_IS_ADSB[df]:
+        features['tc'] = tc
+        decoders = TC_DECODERS.get(tc, ())
     else:
+        decoders = DF_DECODERS.get(df, ())
+
+    for key, decode in decoders:
+        value = decode(msg_str)
+        if value is not None:
+            features[key] = value
+    return features
+
+# вспомогательная функция для генерации метки формата сообщения.
+# Метка зависит только от DF и длины hex-строки, поэтому различных вызовов немного и они кэшируются
+@lru_cache(maxsize=128)
+def get_format_label(df, hex_length):
+    length_type = DF_LENGTH_LUT[df] if 0 <= df < 32 else '?'
+    if length_type == '?':
         # если что-то не так, то пробуем сделать вывод по длине строки
-        length_bits = len(msg_str) * 4
-        if length_bits == 56:
-            length_type = "S"
-        elif length_bits == 112:
-            length_type = "L"
-        else:
-            length_type = "?"
-    
-    label = f"DF{df}"
-    return f"{label}({length_type})"
\ No newline at end of file
+        length_type = HEX_LENGTH_TYPE.get(hex_length, '?')
+    return f"DF{df}({length_type})"
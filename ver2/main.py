@@ -1,12 +1,228 @@
 import sys
+import math
 import argparse
-from datetime import datetime, timezone
+from bisect import bisect_left
+from collections import defaultdict
+import numpy as np
 import pyModeS as pms
 
 import config
 import decoder
 import utils
-from visual import IcaoGraphs
+
+# функция разбирает один файл и возвращает собранные по бортам данные
+# (словари и массивы numpy, без ADSBLog и кэшей декодера)
+def process_file(file_path, target_icao):
+    # инициализация словарей для хранения данных
+    icao_times = {}
+    icao_altitude = defaultdict(utils.series_buffer) # Барометрическая высота
+    icao_gnss_altitude = defaultdict(utils.series_buffer) # ГНСС (барометрическая + разность)
+    icao_speed = defaultdict(utils.series_buffer)
+    icao_callsigns = {}
+    icao_modes = defaultdict(set) # режимы автопилота, включавшиеся на борту
+    icao_squawk = {} # последний код Squawk борта
+    icao_selected_altitude = defaultdict(utils.series_buffer)
+    icao_altitude_difference = defaultdict(utils.series_buffer)
+    icao_baro_correction = defaultdict(utils.series_buffer)
+    adsb_icao_list = set()
+    icao_positions = defaultdict(utils.series_buffer)
+    icao_courses = defaultdict(utils.series_buffer)
+    # последние чётное и нечётное CPR сообщения борта и их время
+    cpr_even_msg, cpr_even_ts = {}, {}
+    cpr_odd_msg, cpr_odd_ts = {}, {}
+    icao_dfs = defaultdict(set) 
+    icao_df_mask = defaultdict(int) # бит номер df установлен, если борт передавал этот DF
+
+    baro_history = defaultdict(list) # (индекс сообщения, время, высота) по порядку файла
+    # время последней сохранённой точки по (борт, ряд): ADS-B повторяет положение и скорость
+    # дважды в секунду, в ряды попадает не больше одной точки за config.MIN_DT
+    last_kept = {}
+
+    # проверка, сохранять ли точку ряда: key - (борт, ряд), запоминает время сохранённой точки
+    def keep(key, timestamp):
+        if abs(timestamp - last_kept.get(key, -math.inf)) < config.MIN_DT:
+            return False
+        last_kept[key] = timestamp
+        return True
+
+    log = decoder.ADSBLog()
+
+    # фаза 1: чтение файла большими блоками, ICAO, время и форматы всех сообщений.
+    # Для каждого сообщения лога запоминается hex и ICAO (None - сообщение пропускается)
+    messages, icaos = [], []
+    for msg_index, message_str, df, tc in decoder.read_ads_b_file(file_path, log, target_icao):
+        messages.append(message_str)
+        try:
+            aa = decoder.fast_icao(message_str, df)
+        except Exception:
+            icaos.append(None)
+            continue 
+
+        if target_icao and aa != target_icao:
+            icaos.append(None)
+            continue
+        icaos.append(aa)
+
+        timestamp = log.timestamps[msg_index]
+        adsb_icao_list.add(aa)
+
+        # сбор статистики по форматам сообщений (DF)
+        fmt_label = decoder.get_format_label(df, len(message_str))
+        icao_dfs[aa].add(fmt_label)
+        icao_df_mask[aa] |= 1 << df
+
+        # обновление времени первого/последнего сообщения
+        if aa not in icao_times:
+            icao_times[aa] = {"first": timestamp, "last": timestamp}
+        else:
+            icao_times[aa]["last"] = timestamp
+
+    # дальше сообщения обрабатываются по группам (DF/TC) отдельными циклами без ветвления по формату
+    phases = decoder.split_phases(log)
+    timestamps = log.timestamps[:len(log)].tolist()
+    dfs = log.dfs[:len(log)].tolist()
+    tcs = log.tcs[:len(log)].tolist()
+    oes = log.oes[:len(log)].tolist()
+
+    # высота из любого доступного DF (Mode S DF0/4/16/20 и ADS-B TC 9-18).
+    # Высота считается пакетом для всей фазы вместе с проверкой диапазона,
+    # по одному сообщению декодируется только код Гиллхема.
+    # Сообщение с ошибкой декодирования исключается из всех следующих фаз
+    alt_rows = phases['alt']
+    low, high = decoder.ALTITUDE_RANGE
+    alts, scalar = decoder.altitude_batch(log, alt_rows)
+    for i, alt, gillham in zip(alt_rows, alts.tolist(), scalar.tolist()):
+        aa = icaos[i]
+        if aa is None: continue
+        if gillham:
+            try:
+                alt = decoder.decode_message(messages[i], dfs[i], tcs[i]).get('alt')
+            except Exception:
+                icaos[i] = None
+                continue
+            if alt is None or not low <= alt <= high: continue
+        elif math.isnan(alt): continue
+
+        # для расчёта GNSS высоты нужны все баро высоты, прореживается только ряд
+        baro_history[aa].append((i, timestamps[i], alt))
+        if keep((aa, "alt"), timestamps[i]):
+            icao_altitude[aa].extend((timestamps[i], alt))
+
+    # извлечение Squawk кода (DF5/21)
+    for i in phases['squawk']:
+        aa = icaos[i]
+        if aa is None: continue
+        try:
+            sq = decoder.decode_message(messages[i], dfs[i], tcs[i]).get('squawk')
+        except Exception:
+            continue
+        if sq:
+            icao_squawk[aa] = sq
+
+    # декодирование координат (CPR)
+    for i in phases['position']:
+        aa = icaos[i]
+        if aa is None: continue
+        message_str, timestamp = messages[i], timestamps[i]
+        try:
+            if oes[i]:
+                cpr_odd_msg[aa], cpr_odd_ts[aa] = message_str, timestamp
+            else:
+                cpr_even_msg[aa], cpr_even_ts[aa] = message_str, timestamp
+            # если есть оба сообщения (чет/нечет) в пределах 10 сек
+            if aa in cpr_even_ts and aa in cpr_odd_ts:
+                t0 = cpr_even_ts[aa]
+                t1 = cpr_odd_ts[aa]
+                if abs(t0 - t1) < 10: # если прошло не больше 10 секунд
+                    pos = pms.adsb.position(cpr_even_msg[aa], cpr_odd_msg[aa], t0, t1)
+                    if pos and keep((aa, "pos"), timestamp):
+                        icao_positions[aa].extend((timestamp, pos[0], pos[1]))
+                    del cpr_even_msg[aa], cpr_even_ts[aa], cpr_odd_msg[aa], cpr_odd_ts[aa]
+        except Exception:
+            continue
+
+    # декодирование скорости и курса: все поля фазы считаются одним пакетом
+    velocity_rows = phases['velocity']
+    speeds, courses, alt_diffs = (v.tolist() for v in decoder.velocity_batch(log, velocity_rows))
+    for i, gs, course, alt_diff in zip(velocity_rows, speeds, courses, alt_diffs):
+        aa = icaos[i]
+        if aa is None: continue
+        timestamp = timestamps[i]
+        if not math.isnan(gs) and keep((aa, "spd"), timestamp):
+            icao_speed[aa].extend((timestamp, gs))
+        if not math.isnan(course) and keep((aa, "hdg"), timestamp):
+            icao_courses[aa].extend((timestamp, course))
+
+        # расчет GNSS высоты на основе баро и разницы высот
+        if math.isnan(alt_diff): continue
+        if keep((aa, "dif"), timestamp):
+            icao_altitude_difference[aa].extend((timestamp, alt_diff))
+
+        # последняя баро высота, принятая до этого сообщения; ГНСС ряд прореживается отдельно
+        # от ряда разницы, иначе пропущенная разница скрыла бы единственную пару с баро
+        history = baro_history.get(aa)
+        k = bisect_left(history, (i,)) - 1 if history else -1
+        if k >= 0:
+            _, last_ts, last_baro = history[k]
+            if abs(timestamp - last_ts) < 5.0 and keep((aa, "gns"), timestamp):
+                gnss_alt = last_baro + alt_diff
+                icao_gnss_altitude[aa].extend((timestamp, gnss_alt))
+
+    # декодирование позывного (ICAO)
+    for i in phases['ident']:
+        aa = icaos[i]
+        if aa is None: continue
+        try:
+            cs = decoder.decode_message(messages[i], dfs[i], tcs[i]).get('callsign')
+        except Exception:
+            continue
+        if cs: icao_callsigns[aa] = cs
+
+    # декодирование параметров автопилота
+    for i in phases['status']:
+        aa = icaos[i]
+        if aa is None: continue
+        timestamp = timestamps[i]
+        try:
+            features = decoder.decode_message(messages[i], dfs[i], tcs[i])
+            sel_alt = features.get('sel_alt')
+            if sel_alt:
+                sel_alt_value, modes = sel_alt
+                icao_selected_altitude[aa].extend((timestamp, sel_alt_value))
+                icao_modes[aa].update(modes)
+
+            baro_corr = features.get('baro')
+            if baro_corr is not None:
+                icao_baro_correction[aa].extend((timestamp, baro_corr))
+        except Exception:
+            continue
+
+    total_icao_count = len(adsb_icao_list)
+
+    # Оставляем только те борта, у которых был хоть один ADS-B пакет
+    # борта, передающие только DF16 или другие Mode S без координат, исключаются
+    # (проверка одного бита DF17 или DF18 в маске принятых DF борта)
+    adsb_icao_list = {icao for icao, mask in icao_df_mask.items() if mask & decoder.ADSB_DF_MASK}
+
+    # ряды сортируются по времени один раз, треки переводятся в массивы (N, 3)
+    icao_altitude = utils.to_sorted_series(icao_altitude)
+    icao_speed = utils.to_sorted_series(icao_speed)
+    icao_courses = utils.to_sorted_series(icao_courses)
+    icao_selected_altitude = utils.to_sorted_series(icao_selected_altitude)
+    icao_altitude_difference = utils.to_sorted_series(icao_altitude_difference)
+    icao_baro_correction = utils.to_sorted_series(icao_baro_correction)
+    icao_gnss_altitude = utils.to_sorted_series(icao_gnss_altitude)
+    icao_positions = utils.to_track_arrays(icao_positions)
+
+    return {
+        "times": icao_times, "dfs": icao_dfs, "callsigns": icao_callsigns, "modes": icao_modes,
+        "squawk": icao_squawk,
+        "adsb_icao_list": adsb_icao_list, "total_icao_count": total_icao_count,
+        "altitude": icao_altitude, "speed": icao_speed, "positions": icao_positions,
+        "courses": icao_courses, "selected_altitude": icao_selected_altitude,
+        "altitude_difference": icao_altitude_difference, "baro_correction": icao_baro_correction,
+        "gnss_altitude": icao_gnss_altitude,
+    }
 
 # --- MAIN ---
 if __name__ == '__main__':
@@ -26,203 +242,65 @@ if __name__ == '__main__':
         sys.exit(1)
 
     for file_path in files_to_process:
-        # инициализация словарей для хранения данных
-        icao_times = {}
-        icao_altitude = {} # Барометрическая высота
-        icao_gnss_altitude = {} # ГНСС (барометрическая + разность)
-        icao_speed = {}
-        icao_callsigns = {}
-        icao_selected_altitude = {}
-        icao_altitude_difference = {}
-        icao_baro_correction = {}
-        icao_has_selected_alt = {}
-        adsb_icao_list = set()
-        icao_positions = {}
-        icao_courses = {}
-        cpr_messages = {}
-        icao_dfs = {} 
-
-        current_baro_buffer = {} 
-
         try:
             print(f"Файл: {file_path}")
-            # чтение файла построчно
-            with open(file_path, "r", encoding="utf-8") as f:
-                for line_num, line in enumerate(f, 1):
-                    if not line.strip(): continue # пропуск пустых строк
-                    parsed = decoder.parse_ads_b_line(line)
-                    if parsed is None: continue
-                    msg, message_spaced, message_str = parsed
-
-                    try:
-                        aa = pms.icao(message_str)
-                        df = pms.df(message_str)
-                    except Exception:
-                        continue 
-
-                    if target_icao and aa != target_icao: continue
-
-                    adsb_icao_list.add(aa)
-                    
-                    # сбор статистики по форматам сообщений (DF)
-                    fmt_label = decoder.get_format_label(message_str, df)
-                    icao_dfs.setdefault(aa, set()).add(fmt_label)
-
-                    # обновление времени первого/последнего сообщения
-                    if aa not in icao_times:
-                        icao_times[aa] = {"first": msg.timestamp, "last": msg.timestamp}
-                    else:
-                        icao_times[aa]["last"] = msg.timestamp
-                    
-                    try:
-                        # попытка извлечения высоты из любого доступного DF
-                        alt = decoder.get_altitude_any_df(message_str, df)
-                        if alt is not None and -2000 <= alt <= 60000:
-                             icao_altitude.setdefault(aa, []).append((msg.timestamp, alt))
-                             current_baro_buffer[aa] = (msg.timestamp, alt)
-                        
-                        # извлечение Squawk кода
-                        sq = decoder.get_squawk(message_str, df)
-                        if sq:
-                            icao_callsigns[f"{aa}_sq"] = sq
-
-                        # обработка ADS-B сообщений (DF17/18)
-                        if df in [17, 18]:
-                            tc = pms.adsb.typecode(message_str)
-                            
-                            # декодирование координат (CPR)
-                            if 9 <= tc <= 18:
-                                cpr_messages.setdefault(aa, [None, None])
-                                oe_flag = pms.adsb.oe_flag(message_str)
-                                cpr_messages[aa][oe_flag] = (message_str, msg.timestamp)
-                                # если есть оба сообщения (чет/нечет) в пределах 10 сек
-                                if all(cpr_messages[aa]):
-                                    msg0, t0 = cpr_messages[aa][0]
-                                    msg1, t1 = cpr_messages[aa][1]
-                                    if abs(t0 - t1) < 10: # если прошло не больше 10 секунд
-                                        pos = pms.adsb.position(msg0, msg1, t0, t1)
-                                        if pos:
-                                            icao_positions.setdefault(aa, []).append((msg.timestamp, pos[0], pos[1]))
-                                        cpr_messages[aa] = [None, None]
-                            
-                            # декодирование скорости и курса
-                            elif tc == 19:
-                                gs = decoder.get_velocity(message_str)
-                                if gs is not None:
-                                    icao_speed.setdefault(aa, []).append((msg.timestamp, gs))
-                                course = decoder.get_course(message_str)
-                                if course is not None:
-                                    icao_courses.setdefault(aa, []).append((msg.timestamp, course))
-                                
-                                # расчет GNSS высоты на основе баро и разницы высот
-                                alt_diff = decoder.get_altitude_difference(message_str)
-                                if alt_diff is not None:
-                                    icao_altitude_difference.setdefault(aa, []).append((msg.timestamp, alt_diff))
-                                    
-                                    if aa in current_baro_buffer:
-                                        last_ts, last_baro = current_baro_buffer[aa]
-                                        if abs(msg.timestamp - last_ts) < 5.0:
-                                            gnss_alt = last_baro + alt_diff
-                                            icao_gnss_altitude.setdefault(aa, []).append((msg.timestamp, gnss_alt))
-
-                            # декодирование позывного (ICAO)
-                            elif 1 <= tc <= 4:
-                                cs = decoder.get_callsign(message_str)
-                                if cs: icao_callsigns[aa] = cs
-
-                            # декодирование параметров автопилота
-                            elif tc == 29:
-                                sel_alt = decoder.get_selected_altitude(message_str)
-                                if sel_alt:
-                                    sel_alt_value, modes = sel_alt
-                                    icao_selected_altitude.setdefault(aa, []).append((msg.timestamp, sel_alt_value))
-                                    icao_has_selected_alt[aa] = True
-                                    modes_key = f"{aa}_modes"
-                                    existing_modes = icao_callsigns.get(modes_key, set())
-                                    icao_callsigns[modes_key] = existing_modes.union(modes)
-                                
-                                baro_corr = decoder.get_baro_correction(message_str)
-                                if baro_corr is not None:
-                                    icao_baro_correction.setdefault(aa, []).append((msg.timestamp, baro_corr))
-                                    
-                    except Exception:
-                        continue
-
-            total_icao_count = len(adsb_icao_list)
-            
-            # Оставляем только те борта, у которых был хоть один ADS-B пакет
-            # борта, передающие только DF16 или другие Mode S без координат, исключаются
-            filtered_icao_list = set()
-            for icao in adsb_icao_list:
-                 # получаем набор форматов для этого борта
-                 dfs = icao_dfs.get(icao, set())
-                 # проверяем, есть ли DF17 или DF18 (это ADS-B)
-                 has_adsb = False
-                 for label in dfs:
-                     if "DF17" in label or "DF18" in label:
-                         has_adsb = True
-                         break
-                
-                 if has_adsb:
-                     filtered_icao_list.add(icao)
-            
-            adsb_icao_list = filtered_icao_list
-            filtered_count = total_icao_count - len(adsb_icao_list)
-
-            # вывод сводной таблицы результатов
-            print("=" * 155)
-            print(" "*65 + "СВОДНАЯ ТАБЛИЦА")
-            print("=" * 155)
-            print(f"{'ICAO':<8} {'Рейс':<12} {'Формат':<24} {'Первое (UTC)':<35} {'Последнее (UTC)':<30} {'POS':<5} {'HDG':<5} {'SEL':<5} {'DIF':<5} {'BAR':<5} {'GNS':<5}")
-            print("-" * 155)
-
-            for icao in sorted(list(adsb_icao_list)):
-                if icao not in icao_times: continue
-                times = icao_times[icao]
-                
-                ts_first = times["first"]
-                ts_last = times["last"]
-                
-                dt_first = datetime.fromtimestamp(int(ts_first), tz=timezone.utc)
-                dt_last = datetime.fromtimestamp(int(ts_last), tz=timezone.utc)
-                
-                first_utc_str = utils.format_timestamp_with_nanoseconds(ts_first)
-                
+            result = process_file(file_path, target_icao)
+            icao_times, adsb_icao_list = result["times"], result["adsb_icao_list"]
+
+            # сводная таблица результатов собирается в список строк и выводится одним print
+            rows = [
+                "=" * 155,
+                " "*65 + "СВОДНАЯ ТАБЛИЦА",
+                "=" * 155,
+                f"{'ICAO':<8} {'Рейс':<12} {'Формат':<24} {'Первое (UTC)':<35} {'Последнее (UTC)':<30} {'POS':<5} {'HDG':<5} {'SEL':<5} {'DIF':<5} {'BAR':<5} {'GNS':<5}",
+                "-" * 155,
+            ]
+
+            # время первого и последнего сообщения всех бортов таблицы форматируется одним вызовом
+            table_icaos = [icao for icao in sorted(adsb_icao_list) if icao in icao_times]
+            ts_first = np.array([icao_times[icao]["first"] for icao in table_icaos], dtype=np.float64)
+            ts_last = np.array([icao_times[icao]["last"] for icao in table_icaos], dtype=np.float64)
+            first_utc_strs = utils.format_timestamps_with_nanoseconds(ts_first)
+            last_utc_strs = utils.format_timestamps_with_nanoseconds(ts_last)
+            same_date = (ts_first.astype(np.int64) // 86400) == (ts_last.astype(np.int64) // 86400)
+
+            for icao, first_utc_str, last_utc_str, same in zip(table_icaos, first_utc_strs, last_utc_strs, same_date):
                 # если дата совпадает, выводим только время последнего сообщения
-                if dt_first.date() == dt_last.date():
-                    main_dt_str = dt_last.strftime('%H:%M:%S')
-                    ts_str = f"{ts_last:.9f}"
-                    nanoseconds_str = ts_str.split('.')[1]
-                    last_utc_str = f"{main_dt_str}.{nanoseconds_str}"
-                else:
-                    last_utc_str = utils.format_timestamp_with_nanoseconds(ts_last)
+                if same:
+                    last_utc_str = last_utc_str[11:]
                 
-                callsign = icao_callsigns.get(icao, "N/A")
-                squawk = icao_callsigns.get(f"{icao}_sq", "")
+                callsign = result["callsigns"].get(icao, "N/A")
+                squawk = result["squawk"].get(icao, "")
                 if callsign == "N/A" and squawk:
                     callsign = f"SQ:{squawk}"
                 
-                my_dfs = sorted(list(icao_dfs.get(icao, set())))
-                dfs_str = ",".join(my_dfs)
+                dfs_str = ",".join(sorted(result["dfs"].get(icao, ())))
                 if len(dfs_str) > 22: dfs_str = dfs_str[:19] + "..."
 
-                # флаги наличия данных
-                pos_flag = "+" if icao in icao_positions and icao_positions[icao] else "-"
-                hdg_flag = "+" if icao in icao_courses and icao_courses[icao] else "-"
-                sel_flag = "+" if icao_has_selected_alt.get(icao) else "-"
-                dif_flag = "+" if icao in icao_altitude_difference and icao_altitude_difference[icao] else "-"
-                bar_flag = "+" if icao in icao_baro_correction and icao_baro_correction[icao] else "-"
-                gnss_flag = "+" if icao in icao_gnss_altitude and icao_gnss_altitude[icao] else "-"
+                # флаги наличия данных: ключ появляется в словаре только вместе с первой точкой,
+                # а первая точка каждого ряда проходит прореживание, поэтому проверка
+                # принадлежности совпадает с наличием данных до прореживания
+                pos_flag = "+" if icao in result["positions"] else "-"
+                hdg_flag = "+" if icao in result["courses"] else "-"
+                sel_flag = "+" if icao in result["selected_altitude"] else "-"
+                dif_flag = "+" if icao in result["altitude_difference"] else "-"
+                bar_flag = "+" if icao in result["baro_correction"] else "-"
+                gnss_flag = "+" if icao in result["gnss_altitude"] else "-"
 
-                print(f"{icao:<8} {callsign:<12} {dfs_str:<24} {first_utc_str:<35} {last_utc_str:<30} {pos_flag:<5} {hdg_flag:<5} {sel_flag:<5} {dif_flag:<5} {bar_flag:<5} {gnss_flag:<5}")
-                
-            print(f"\nВсего бортов обнаружено: {total_icao_count}")
-            print(f"Отфильтровано (без ADS-B): {filtered_count}")
+                rows.append(f"{icao:<8} {callsign:<12} {dfs_str:<24} {first_utc_str:<35} {last_utc_str:<30} {pos_flag:<5} {hdg_flag:<5} {sel_flag:<5} {dif_flag:<5} {bar_flag:<5} {gnss_flag:<5}")
+
+            print("\n".join(rows))
+            print(f"\nВсего бортов обнаружено: {result['total_icao_count']}")
+            print(f"Отфильтровано (без ADS-B): {result['total_icao_count'] - len(adsb_icao_list)}")
             print(f"Осталось бортов (ADS-B): {len(adsb_icao_list)}\n")
 
-            # запуск визуализации
-            IcaoGraphs(icao_altitude, icao_speed, icao_positions, icao_courses, adsb_icao_list, icao_callsigns, 
-                       icao_selected_altitude, icao_altitude_difference, icao_baro_correction, icao_gnss_altitude)
+            # запуск визуализации; модуль графиков (и matplotlib, ~0.5 с) загружается только здесь,
+            # поэтому разбор файла и сводная таблица его не ждут
+            from visual import IcaoGraphs
+            IcaoGraphs(result["altitude"], result["speed"], result["positions"], result["courses"],
+                       adsb_icao_list, result["callsigns"], result["selected_altitude"],
+                       result["altitude_difference"], result["baro_correction"], result["gnss_altitude"],
+                       result["modes"], result["squawk"])
 
         except FileNotFoundError:
             print(f"Файл {file_path} не найден")
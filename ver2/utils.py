@@ -1,24 +1,45 @@
-from datetime import datetime, timezone
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import os
 import sys
-from config import DATA_DIR, DEFAULT_LOG_EXTENSION
-
-# функция конвертирует unix timestamp в объект datetime
-def timestamp_to_utc(timestamp):
-    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
-
-# функция форматирует время, сохраняя наносекунды для точности
-def format_timestamp_with_nanoseconds(ts):
-    # форматируем основную часть времени (до секунд)
-    main_dt = datetime.fromtimestamp(int(ts), tz=timezone.utc)
-    main_dt_str = main_dt.strftime('%Y-%m-%d %H:%M:%S')
-    
-    # получаем дробную часть времени (наносекунды) как строку
-    ts_str = f"{ts:.9f}"
-    nanoseconds_str = ts_str.split('.')[1]
-    
-    # соединяем обе части
-    return f"{main_dt_str}.{nanoseconds_str}"
+import numpy as np
+from config import DATA_DIR, DEFAULT_LOG_EXTENSION, READ_BUFFER_SIZE
+
+# функция форматирует массив unix timestamp в строки UTC, сохраняя наносекунды для точности.
+# Строки для всего массива считаются одной операцией numpy (datetime64[ns]), без datetime
+# на каждое значение; целые секунды и наносекунды отделяются арифметикой, поэтому
+# точность float64 не теряется
+def format_timestamps_with_nanoseconds(ts_array):
+    ts_array = np.asarray(ts_array, dtype=np.float64)
+    sec = np.floor(ts_array).astype(np.int64)
+    ns = np.rint((ts_array - sec) * 1_000_000_000).astype(np.int64)
+    stamps = (sec * 1_000_000_000 + ns).astype('datetime64[ns]')
+    return [s.replace('T', ' ') for s in np.datetime_as_string(stamps, unit='ns')]
+
+# буфер точек ряда одного борта: значения подряд в array('d') (t, v, t, v, ...),
+# без отдельного tuple и float-объектов на каждую точку
+def series_buffer():
+    return array('d')
+
+# функция переводит ряды {icao: буфер (t, v, ...)} в {icao: (массив t, массив v)},
+# отсортированные по времени один раз, чтобы графики не сортировали их при каждой перерисовке.
+# Точки лога обычно уже идут по времени: такой ряд проверяется за один проход и не сортируется
+def to_sorted_series(series_dict):
+    result = {}
+    for icao, buffer in series_dict.items():
+        points = np.frombuffer(buffer, dtype=np.float64).reshape(-1, 2)
+        ts, values = points[:, 0], points[:, 1]
+        if np.all(ts[1:] > ts[:-1]):
+            result[icao] = (ts, values)
+            continue
+        order = np.lexsort((values, ts))
+        result[icao] = (ts[order], values[order])
+    return result
+
+# функция переводит треки {icao: буфер (t, lat, lon, ...)} в {icao: массив (N, 3)} без копирования
+def to_track_arrays(positions_dict):
+    return {icao: np.frombuffer(buffer, dtype=np.float64).reshape(-1, 3) for icao, buffer in positions_dict.items()}
 
 # Функция выбора файла
 def choose_input_file(cli_file: str | None) -> list[Path]:
@@ -33,10 +54,34 @@ def choose_input_file(cli_file: str | None) -> list[Path]:
     if not DATA_DIR.exists():
         raise FileNotFoundError(f"Папка {DATA_DIR} не существует")
 
-    files = sorted(DATA_DIR.glob(f"*{DEFAULT_LOG_EXTENSION}"))
+    # один проход по каталогу без сопоставления шаблона glob
+    with os.scandir(DATA_DIR) as entries:
+        files = sorted(Path(e.path) for e in entries if e.is_file() and e.name.endswith(DEFAULT_LOG_EXTENSION))
     if not files:
         raise FileNotFoundError(
             f"В папке {DATA_DIR} нет файлов {DEFAULT_LOG_EXTENSION}"
         )
 
-    return [files[0]]
\ No newline at end of file
+    return [files[0]]
+
+# генератор блоков текста файла из целых строк: читаем большими блоками, а не построчно.
+# Следующий блок читается в фоновом потоке, пока разбирается текущий
+# (чтение файла отпускает GIL, поэтому диск и разбор работают параллельно)
+def iter_text_blocks(path, buffer_size=READ_BUFFER_SIZE):
+    carry = b""
+    with open(path, "rb") as f, ThreadPoolExecutor(max_workers=1) as reader:
+        pending = reader.submit(f.read, buffer_size)
+        while True:
+            buf = pending.result()
+            if not buf:
+                break
+            pending = reader.submit(f.read, buffer_size)
+            buf = carry + buf
+            # последняя строка блока может быть неполной, дочитаем её со следующим блоком
+            cut = buf.rfind(b"\n") + 1
+            carry = buf[cut:]
+            # логи содержат только ascii (время и hex), поэтому декодируем как ascii;
+            # hex приводим к верхнему регистру сразу для всего блока, а не в каждой строке
+            yield buf[:cut].upper().decode("ascii", errors="replace")
+    if carry:
+        yield carry.upper().decode("ascii", errors="replace")
@@ -1,36 +1,107 @@
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+import matplotlib.ticker as ticker
 from matplotlib.widgets import Button
+from matplotlib.backend_bases import TimerBase
 import numpy as np
-from utils import timestamp_to_utc # Импортируем утилиту времени
+from datetime import datetime, timezone
+
+# смещение unix-эпохи в единицах дат matplotlib (дни)
+MPL_EPOCH_OFFSET = mdates.date2num(datetime(1970, 1, 1, tzinfo=timezone.utc))
+
+# функция переводит массив unix timestamp в даты matplotlib одной операцией numpy
+def ts_to_mpl(ts_array):
+    return np.asarray(ts_array, dtype=np.float64) / 86400.0 + MPL_EPOCH_OFFSET
+
+# больше точек на одной линии графика во времени не рисуется: ширина окна ~1200 пикселей
+MAX_PLOT_POINTS = 2000
+
+# при большем числе видимых точек линия ряда рисуется без маркеров: маркеры сливаются,
+# а их отрисовка занимает основную часть времени
+MARKER_MAX_POINTS = 1500
+
+# индексы n_out точек ряда (x, y), сохраняющих его форму, по алгоритму LTTB
+# (Largest-Triangle-Three-Buckets): первая и последняя точки остаются, из каждой корзины
+# между ними берётся точка, дающая наибольший треугольник с уже выбранной точкой
+# и средней точкой следующей корзины
+def lttb_indices(x, y, n_out):
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # средние точки всех корзин не зависят от выбора и считаются сразу для всех
+    counts = np.diff(edges, append=n)
+    avg_x = (np.add.reduceat(x, edges) / counts).tolist()
+    avg_y = (np.add.reduceat(y, edges) / counts).tolist()
+    bounds = edges.tolist()
+    idx = [0] * n_out
+    idx[-1] = n - 1
+    a = 0
+    for k in range(n_out - 2):
+        lo, hi = bounds[k], bounds[k + 1]
+        xa, ya = x[a], y[a]
+        # удвоенная площадь треугольника линейна по точке корзины: |c1*y + c2*x - c0|
+        c1, c2 = xa - avg_x[k + 1], avg_y[k + 1] - ya
+        area = np.abs(c1 * y[lo:hi] + c2 * x[lo:hi] - (c1 * ya + c2 * xa))
+        a = lo + int(area.argmax())
+        idx[k + 1] = a
+    return np.array(idx)
+
+# индексы точек окна [lo, hi) ряда для отрисовки: прореживание LTTB, к которому добавлены
+# минимум и максимум окна, чтобы автомасштаб оси y совпадал с полными данными
+def plot_indices(x, y, lo, hi):
+    idx = lo + lttb_indices(x[lo:hi], y[lo:hi], MAX_PLOT_POINTS)
+    extremes = lo + np.array([np.argmin(y[lo:hi]), np.argmax(y[lo:hi])])
+    return np.union1d(idx, extremes)
+
+# функция переводит время рядов {icao: (ts, values)} в даты matplotlib
+def series_to_mpl(series_dict):
+    return {icao: (ts_to_mpl(ts), values) for icao, (ts, values) in series_dict.items()}
 
 # класс для создания и управления окном с графиками
 class IcaoGraphs:
     # конструктор класса, вызывается при создании объекта
     def __init__(self, alt_dict, spd_dict, pos_dict, course_dict, adsb_icao_list, icao_callsigns, 
-                 icao_sel_alt, icao_alt_diff, icao_baro_correction, icao_gnss_alt):
+                 icao_sel_alt, icao_alt_diff, icao_baro_correction, icao_gnss_alt, icao_modes=None, icao_squawk=None):
         
-        # собираем все icao, по которым есть какие-либо данные
-        icao_with_data = set(alt_dict.keys()) | set(spd_dict.keys()) | set(pos_dict.keys()) | set(course_dict.keys()) | set(icao_gnss_alt.keys())
-        
-        # пересечение: берем только те борта, которые есть в очищенном adsb_icao_list
-        self.icao_list = sorted(list(icao_with_data.intersection(adsb_icao_list)))
+        # берем только те борта из очищенного adsb_icao_list, по которым есть какие-либо данные:
+        # проверка по ключам словарей, без промежуточных объединений множеств
+        data_dicts = (alt_dict, spd_dict, pos_dict, course_dict, icao_gnss_alt)
+        self.icao_list = sorted(icao for icao in set(adsb_icao_list) if any(icao in d for d in data_dicts))
+        # множество для быстрой проверки принадлежности при каждой перерисовке
+        self.icao_set = set(self.icao_list)
         
         # если нет данных, выводим сообщение и выходим
         if not self.icao_list:
             print("Нет данных для построения графиков")
             return
 
-        # сохраняем словари с данными в атрибутах класса
-        self.alt_dict = alt_dict
-        self.spd_dict = spd_dict
+        # сохраняем словари с данными в атрибутах класса;
+        # время рядов переводится в даты matplotlib один раз, а не при каждой перерисовке
+        self.alt_dict = series_to_mpl(alt_dict)
+        self.spd_dict = series_to_mpl(spd_dict)
         self.pos_dict = pos_dict
-        self.course_dict = course_dict
+        self.pos_times = {icao: ts_to_mpl(track[:, 0]) for icao, track in pos_dict.items()}
+        self.course_dict = series_to_mpl(course_dict)
         self.icao_callsigns = icao_callsigns
-        self.sel_alt_dict = icao_sel_alt if icao_sel_alt else {}
-        self.alt_diff_dict = icao_alt_diff if icao_alt_diff else {}
-        self.baro_correction_dict = icao_baro_correction if icao_baro_correction else {} 
-        self.gnss_alt_dict = icao_gnss_alt if icao_gnss_alt else {}
+        self.sel_alt_dict = series_to_mpl(icao_sel_alt) if icao_sel_alt else {}
+        self.alt_diff_dict = series_to_mpl(icao_alt_diff) if icao_alt_diff else {}
+        self.baro_correction_dict = series_to_mpl(icao_baro_correction) if icao_baro_correction else {} 
+        self.gnss_alt_dict = series_to_mpl(icao_gnss_alt) if icao_gnss_alt else {}
+        self.icao_modes = icao_modes if icao_modes else {} # режимы автопилота по борту
+        self.icao_squawk = icao_squawk if icao_squawk else {} # код Squawk по борту
+
+        # подпись борта для заголовков (позывной, squawk, icao, режимы автопилота)
+        # не меняется после загрузки, поэтому собирается один раз для каждого борта
+        self.display_ids = {}
+        for icao in self.icao_list:
+            callsign = self.icao_callsigns.get(icao, "N/A")
+            squawk = self.icao_squawk.get(icao, "")
+            if squawk: callsign += f" (SQ:{squawk})"
+
+            active_modes = self.icao_modes.get(icao, ())
+            mode_str = f" ({', '.join(sorted(active_modes))})" if active_modes else ""
+            self.display_ids[icao] = f"{callsign} ({icao}){mode_str}" if callsign != "N/A" else f"{icao}{mode_str}"
         
         self.icao_index = 0
         
@@ -55,94 +126,353 @@ class IcaoGraphs:
         # создание окна и основной области для рисования
         self.fig, self.ax = plt.subplots(figsize=(12, 7))
         self.fig.canvas.manager.set_window_title('Графики бортов')
-        plt.subplots_adjust(bottom=0.25) # оставляем место снизу для кнопок
         
         self.ax2 = None
+        # фон окна без осей графика (кнопки) для быстрой перерисовки при масштабировании
+        self.scroll_background = None
+        # общая карта нарисована полностью и с тех пор не масштабировалась;
+        # изображение её осей без выбранного трека (для быстрой смены борта)
+        self.tracks_view = False
+        self.tracks_background = None
+        # пределы осей, с которыми график нарисован полностью (запоминаются при первой
+        # перерисовке после plot_current); их изменение значит масштабирование пользователем
+        self.shown_limits = None
+        # (борт, режим) нарисованного графика: повторная отрисовка того же графика пропускается
+        self.shown_state = None
 
-        # создание областей для кнопок
-        ax_prev_icao = plt.axes([0.05, 0.05, 0.2, 0.075])
-        ax_next_icao = plt.axes([0.28, 0.05, 0.2, 0.075])
-        ax_prev_mode = plt.axes([0.52, 0.05, 0.2, 0.075])
-        ax_next_mode = plt.axes([0.75, 0.05, 0.2, 0.075])
-        
-        # создание и настройка кнопок
-        self.btn_prev_icao = Button(ax_prev_icao, '<- Пред. борт', color='lightblue', hovercolor='skyblue')
-        self.btn_next_icao = Button(ax_next_icao, 'След. борт ->', color='lightblue', hovercolor='skyblue')
-        self.btn_prev_mode = Button(ax_prev_mode, '<- Пред. график', color='lightgreen', hovercolor='limegreen')
-        self.btn_next_mode = Button(ax_next_mode, 'След. график ->', color='lightgreen', hovercolor='limegreen')
-        
-        # привязка функций-обработчиков к кнопкам
-        self.btn_prev_icao.on_clicked(self.prev_icao)
-        self.btn_next_icao.on_clicked(self.next_icao)
-        self.btn_prev_mode.on_clicked(self.prev_mode)
-        self.btn_next_mode.on_clicked(self.next_mode)
+        # линии каждого режима (создаются один раз, для другого борта меняются только данные),
+        # линии текущего графика и общая линия всех треков
+        self.mode_lines = {}
+        self.current_lines = []
+        self.all_tracks_line = None
+        # полные данные прореженных линий: линия -> (x, y, нарисованное окно индексов)
+        self.full_data = {}
+        # исходные маркеры линий рядов во времени (скрываются, когда видимых точек слишком много)
+        self.line_markers = {}
+        # постоянная надпись "нет данных", меняется только её текст
+        self.message = self.ax.text(0.5, 0.5, "", ha='center', va='center', transform=self.ax.transAxes, visible=False)
+        # исходный цвет подписей оси y (для возврата после комбинированного графика)
+        self.ytick_labelcolor = plt.rcParams['ytick.labelcolor']
+        if self.ytick_labelcolor == 'inherit':
+            self.ytick_labelcolor = plt.rcParams['ytick.color']
+
+        # кнопки навигации: подпись, обработчик, цвет и цвет при наведении
+        buttons = [
+            ('<- Пред. борт', self.prev_icao, 'lightblue', 'skyblue'),
+            ('След. борт ->', self.next_icao, 'lightblue', 'skyblue'),
+            ('<- Пред. график', self.prev_mode, 'lightgreen', 'limegreen'),
+            ('След. график ->', self.next_mode, 'lightgreen', 'limegreen'),
+        ]
+        # в окне Tk/Qt кнопки делаются родными виджетами окна (нажатие и наведение
+        # не перерисовывают холст), для остальных бэкендов - виджетами matplotlib под графиком
+        if not self.add_native_buttons(buttons):
+            self.add_mpl_buttons(buttons)
         
         # подключение обработчиков событий клавиатуры и колеса мыши
         self.fig.canvas.mpl_connect('key_press_event', self.on_key)
         self.fig.canvas.mpl_connect('scroll_event', self.on_scroll)
+        # после любой полной перерисовки сохранённый фон для блиттинга устаревает
+        self.fig.canvas.mpl_connect('draw_event', self.reset_backgrounds)
+        # при изменении пределов по времени прореженные линии пересчитываются для видимого окна
+        self.ax.callbacks.connect('xlim_changed', self.on_xlim_changed)
+        # масштабирование колесом, лупой и сдвигом панели инструментов меняет пределы осей
+        self.ax.callbacks.connect('xlim_changed', self.on_limits_changed)
+        self.ax.callbacks.connect('ylim_changed', self.on_limits_changed)
+
+        # однократный таймер для отложенной перерисовки при навигации;
+        # у неинтерактивных бэкендов (Agg) таймер не срабатывает, там рисуем сразу
+        self.redraw_pending = False
+        self.redraw_timer = self.fig.canvas.new_timer(interval=0)
+        if type(self.redraw_timer) is TimerBase:
+            self.redraw_timer = None
+        else:
+            self.redraw_timer.single_shot = True
+            self.redraw_timer.add_callback(self.do_redraw)
         
         # первоначальная отрисовка графика
         self.plot_current()
         plt.show()
 
-    # главная функция отрисовки текущего графика
+    # функция добавляет кнопки в окно Tk или Qt под холстом; возвращает False для других бэкендов
+    def add_native_buttons(self, buttons):
+        backend = plt.get_backend().lower()
+        window = getattr(self.fig.canvas.manager, 'window', None)
+        if window is None:
+            return False
+
+        if backend.startswith('tk'):
+            import tkinter as tk
+            frame = tk.Frame(window)
+            for text, callback, color, hovercolor in buttons:
+                # кнопка не забирает фокус, чтобы клавиши-стрелки продолжали приходить на холст
+                tk.Button(frame, text=text, command=callback, bg=color, activebackground=hovercolor,
+                          takefocus=0).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=4, pady=4)
+            frame.pack(side=tk.BOTTOM, fill=tk.X, before=self.fig.canvas.get_tk_widget())
+            self.native_buttons = frame
+            return True
+
+        if backend.startswith('qt'):
+            from matplotlib.backends.qt_compat import QtCore, QtWidgets
+            bar = QtWidgets.QToolBar(window)
+            bar.setMovable(False)
+            for text, callback, color, hovercolor in buttons:
+                button = QtWidgets.QPushButton(text)
+                button.setFocusPolicy(QtCore.Qt.FocusPolicy.NoFocus)
+                button.setStyleSheet(f"QPushButton {{ background: {color}; }} QPushButton:hover {{ background: {hovercolor}; }}")
+                button.clicked.connect(lambda checked=False, callback=callback: callback())
+                bar.addWidget(button)
+            window.addToolBar(QtCore.Qt.ToolBarArea.BottomToolBarArea, bar)
+            self.native_buttons = bar
+            return True
+
+        return False
+
+    # функция рисует кнопки виджетами matplotlib в нижней части окна
+    def add_mpl_buttons(self, buttons):
+        plt.subplots_adjust(bottom=0.25) # оставляем место снизу для кнопок
+        self.mpl_buttons = []
+        for k, (text, callback, color, hovercolor) in enumerate(buttons):
+            button_ax = plt.axes([(0.05, 0.28, 0.52, 0.75)[k], 0.05, 0.2, 0.075])
+            button = Button(button_ax, text, color=color, hovercolor=hovercolor)
+            button.on_clicked(callback)
+            self.mpl_buttons.append(button)
+
+    # главная функция отрисовки текущего графика.
+    # Линии каждого режима создаются один раз и хранятся в self.mode_lines, при смене борта
+    # им передаются новые данные (set_data); линии прошлого графика открепляются от осей
     def plot_current(self):
-        # удаляем вторую ось y, если она есть
-        if self.ax2:
+        # тот же борт и режим уже на экране (например, "след. борт" при единственном борте)
+        state = (self.icao_index, self.plot_mode_idx)
+        if state == self.shown_state: return
+        self.shown_state = state
+
+        mode = self.plot_modes[self.plot_mode_idx] if self.icao_list else None
+
+        # на уже нарисованной общей карте при смене борта меняется только красный трек
+        if mode == 'all_tracks' and self.tracks_view and self.fig.canvas.supports_blit:
+            self.blit_selected_track(self.icao_list[self.icao_index])
+            return
+        self.tracks_view = False
+        self.shown_limits = None
+
+        # открепляем линии предыдущего графика (остаются в self.mode_lines)
+        for line in self.current_lines:
+            line.remove()
+        self.current_lines = []
+
+        # удаляем вторую ось y, если она больше не нужна, вместе с её графиками
+        if self.ax2 and mode != 'altitude_speed_combined':
             self.ax2.remove()
             self.ax2 = None
-        self.ax.clear()
-        self.ax.set_aspect('auto')
+            self.mode_lines.pop('altitude_speed_combined', None)
+
+        self.reset_axes()
 
         # проверка наличия данных
         if not self.icao_list:
-            self.ax.text(0.5, 0.5, "Нет бортов с данными для отображения", 
-                         ha='center', va='center', transform=self.ax.transAxes)
+            self.message.set_text("Нет бортов с данными для отображения")
+            self.message.set_visible(True)
             self.fig.canvas.draw_idle()
             return
 
         icao = self.icao_list[self.icao_index]
-        mode = self.plot_modes[self.plot_mode_idx]
-        
-        # формирование заголовка
-        callsign = self.icao_callsigns.get(icao, "N/A")
-        squawk = self.icao_callsigns.get(f"{icao}_sq", "")
-        if squawk: callsign += f" (SQ:{squawk})"
-        
-        modes_key = f"{icao}_modes"
-        active_modes = self.icao_callsigns.get(modes_key, set())
-        mode_str = f" ({', '.join(sorted(active_modes))})" if active_modes else ""
-        display_id = f"{callsign} ({icao}){mode_str}" if callsign != "N/A" else f"{icao}{mode_str}"
+
+        # линии режима получают данные текущего борта и прикрепляются к осям
+        title, label, lines, lines2, message = self.update_lines(icao, mode)
+        self.current_lines = lines + lines2
+
+        if message:
+            self.message.set_text(message)
+            self.message.set_visible(True)
+
+        # установка заголовка и сетки
+        self.ax.set_title(title)
+        self.ax.grid(True, linestyle='--', alpha=0.7)
+
+        # настройка осей в зависимости от типа графика
+        if mode == 'track' or mode == 'all_tracks':
+            self.ax.set_aspect('equal', adjustable='datalim')
+            self.ax.set_xlabel("Долгота (°)")
+            self.ax.set_ylabel("Широта (°)")
+        else:
+            self.ax.set_xlabel("Время (UTC)")
+            self.ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+            self.ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+            self.fig.autofmt_xdate(rotation=30)
+            if mode != 'altitude_speed_combined':
+                self.ax.set_ylabel(label)
+
+        # пределы осей пересчитываются по прикреплённым линиям; ось x общая с второй осью,
+        # поэтому на комбинированном графике хватает линий только второй оси (скорость без высоты)
+        if mode == 'altitude_speed_combined':
+            self.ax2.relim()
+            self.ax2.autoscale_view()
+        if lines or lines2:
+            self.ax.autoscale_view()
+            # у левой оси без высоты данных нет, её шкала остаётся 0..1
+            if not lines:
+                self.ax.set_ylim(0, 1)
+        else:
+            self.ax.set_xlim(0, 1)
+            self.ax.set_ylim(0, 1)
+
+        # отображение легенды
+        if mode == 'altitude_speed_combined':
+            # вторая ось показывается только для борта, у которого есть данные
+            self.ax2.set_visible(bool(lines or lines2))
+            if lines or lines2:
+                self.ax.set_ylabel("Высота (футы)", color='blue')
+                self.ax.tick_params(axis='y', labelcolor='blue')
+                self.ax.legend(handles=lines + lines2, loc='upper left')
+        else:
+            handles = [line for line in lines if not line.get_label().startswith('_')]
+            if handles:
+                self.ax.legend(handles=handles)
+
+        # применение масштабирования
+        if mode != 'altitude_speed_combined' and mode != 'all_tracks':
+            ylim = self.ylims[mode].get(icao, self.default_ylims.get(mode))
+            if ylim and ylim != 'auto':
+                self.ax.set_ylim(ylim)
+
+        self.tracks_view = mode == 'all_tracks' and bool(self.pos_dict)
+        self.fig.canvas.draw_idle()
+
+    # смена борта на общей карте без полной перерисовки: серые треки, оси и пределы
+    # не меняются (трек борта лежит внутри общей линии), поэтому изображение осей без
+    # красного трека и легенды сохраняется один раз, затем только восстанавливается,
+    # а поверх рисуются новый красный трек и легенда
+    def blit_selected_track(self, icao):
+        canvas = self.fig.canvas
+        for line in self.current_lines:
+            line.remove()
+        _, _, self.current_lines, _, _ = self.update_lines(icao, 'all_tracks')
+        if self.ax.legend_:
+            self.ax.legend_.remove()
+        overlay = [line for line in self.current_lines if not line.get_label().startswith('_')]
+        if overlay:
+            overlay.append(self.ax.legend(handles=overlay))
+
+        if self.tracks_background is None:
+            for artist in overlay:
+                artist.set_visible(False)
+            canvas.draw()
+            self.tracks_background = canvas.copy_from_bbox(self.ax.bbox)
+            for artist in overlay:
+                artist.set_visible(True)
+        else:
+            canvas.restore_region(self.tracks_background)
+        for artist in overlay:
+            self.fig.draw_artist(artist)
+        canvas.blit(self.ax.bbox)
+
+    # функция возвращает основную ось в исходное состояние (как после ax.clear()),
+    # но не удаляет с неё линии
+    def reset_axes(self):
+        self.ax.set_title('')
+        self.ax.set_xlabel('')
+        self.ax.set_ylabel('', color=plt.rcParams['axes.labelcolor'])
+        self.ax.tick_params(axis='y', labelcolor=self.ytick_labelcolor)
+        self.ax.set_aspect('auto')
+        self.ax.xaxis.set_major_locator(ticker.AutoLocator())
+        self.ax.xaxis.set_major_formatter(ticker.ScalarFormatter())
+        if self.ax.legend_:
+            self.ax.legend_.remove()
+        self.message.set_visible(False)
+        self.ax.set_autoscale_on(True)
+        self.ax.relim()
+
+    # функция возвращает линию name режима mode с данными (x, y), прикреплённую к осям axes:
+    # при первом вызове линия создаётся через plot, затем у неё меняются только данные.
+    # Длинные ряды во времени рисуются прореженными (кроме ступенчатых линий: прореживание
+    # потеряло бы моменты смены значения), полные данные хранятся в self.full_data.
+    # Маркеры таких рядов показываются, только если точек на графике не больше MARKER_MAX_POINTS
+    def mode_line(self, mode, name, axes, x, y, *args, **kwargs):
+        time_series = mode != 'track' and mode != 'all_tracks'
+        full = None
+        if len(x) > MAX_PLOT_POINTS and time_series and 'drawstyle' not in kwargs:
+            full = (x, y, (0, len(x)))
+            idx = plot_indices(x, y, 0, len(x))
+            x, y = x[idx], y[idx]
+
+        lines = self.mode_lines.setdefault(mode, {})
+        line = lines.get(name)
+        if line is None:
+            line, = axes.plot(x, y, *args, **kwargs)
+            lines[name] = line
+            if time_series and line.get_marker() not in ('None', ''):
+                self.line_markers[line] = line.get_marker()
+        else:
+            line.set_data(x, y)
+            axes.add_line(line)
+
+        if full:
+            self.full_data[line] = full
+        else:
+            self.full_data.pop(line, None)
+        if line in self.line_markers:
+            self.show_markers(line, len(x))
+        return line
+
+    # функция включает исходные маркеры линии, если на графике видно не больше MARKER_MAX_POINTS точек
+    def show_markers(self, line, count):
+        line.set_marker(self.line_markers[line] if count <= MARKER_MAX_POINTS else 'None')
+
+    # функция-обработчик изменения пределов по оси x: прореженные линии текущего графика
+    # заново прореживаются по видимому окну (при приближении видно больше точек),
+    # маркеры включаются или выключаются по числу точек в окне
+    def on_xlim_changed(self, ax):
+        x0, x1 = ax.get_xlim()
+        for line in self.current_lines:
+            entry = self.full_data.get(line)
+            if entry is not None:
+                x, y, window = entry
+                lo = max(int(np.searchsorted(x, x0)) - 1, 0)
+                hi = min(int(np.searchsorted(x, x1, side='right')) + 1, len(x))
+                if (lo, hi) != window and hi - lo >= 2:
+                    idx = plot_indices(x, y, lo, hi)
+                    line.set_data(x[idx], y[idx])
+                    self.full_data[line] = (x, y, (lo, hi))
+            if line in self.line_markers:
+                x = line.get_xdata()
+                self.show_markers(line, int(np.searchsorted(x, x1, side='right') - np.searchsorted(x, x0)))
+
+    # то же для горизонтальной опорной линии (данные у неё не меняются)
+    def mode_hline(self, mode, name, y, **kwargs):
+        lines = self.mode_lines.setdefault(mode, {})
+        line = lines.get(name)
+        if line is None:
+            line = lines[name] = self.ax.axhline(y=y, **kwargs)
+        else:
+            self.ax.add_line(line)
+        return line
+
+    # функция передаёт линиям режима данные борта.
+    # Возвращает заголовок, подпись оси y, линии основной и второй оси и текст "нет данных"
+    def update_lines(self, icao, mode):
+        display_id = self.display_ids[icao]
         
         data = None
         label = ""
         title = ""
+        message = ""
+        lines, lines2 = [], []
 
         # Режим общей карты: отображение треков всех бортов одновременно
         if mode == 'all_tracks':
             title = "ОБЩАЯ КАРТА (Все обнаруженные треки)"
             
             if not self.pos_dict:
-                 self.ax.text(0.5, 0.5, "В этом файле нет координат (GPS) ни для одного борта", 
-                              ha='center', transform=self.ax.transAxes)
+                message = "В этом файле нет координат (GPS) ни для одного борта"
             else:
-                # отрисовка треков всех бортов серым, а текущий выделяем красным
-                for track_icao, track_data in self.pos_dict.items():
-                    # фильтрация треков на карте так же, как и список бортов
-                    if track_icao not in self.icao_list: continue
-
-                    lons = [lon for t, lat, lon in track_data]
-                    lats = [lat for t, lat, lon in track_data]
-                    
-                    if track_icao == icao:
-                        self.ax.plot(lons, lats, 'o-', color='red', linewidth=2, markersize=4, 
-                                     label=f"{display_id} (Выбран)", zorder=10)
-                    else:
-                        self.ax.plot(lons, lats, '-', color='grey', linewidth=1, alpha=0.6, zorder=1)
-
-            self.ax.set_aspect('equal', adjustable='datalim')
-            self.ax.set_xlabel("Долгота (°)")
-            self.ax.set_ylabel("Широта (°)")
+                # треки всех бортов серым - одна общая линия для всех бортов,
+                # поверх неё текущий борт выделяется красным
+                lines.append(self.get_all_tracks_line())
+                data = self.pos_dict.get(icao)
+                if data is not None:
+                    line = self.mode_line(mode, 'selected', self.ax, data[:, 2], data[:, 1], 'o-', color='red', linewidth=2, markersize=4, zorder=10)
+                    line.set_label(f"{display_id} (Выбран)")
+                    lines.append(line)
 
         # блок отрисовки графика высоты (барометрической)
         elif mode == 'altitude':
@@ -150,17 +480,14 @@ class IcaoGraphs:
             sel_data = self.sel_alt_dict.get(icao)
             title, label = f"Высота: {display_id}", "Высота (футы)"
             if not data and not sel_data:
-                self.ax.text(0.5, 0.5, f"Нет данных о высоте для борта {icao}", 
-                             ha='center', va='center', transform=self.ax.transAxes)
+                message = f"Нет данных о высоте для борта {icao}"
             else:
                 if data:
-                    times = [timestamp_to_utc(t) for t, v in sorted(data)]
-                    values = [v for t, v in sorted(data)]
-                    self.ax.plot(times, values, 'o-', markersize=3, label='Барометрическая высота', color='blue')
+                    times, values = data
+                    lines.append(self.mode_line(mode, 'baro', self.ax, times, values, 'o-', markersize=3, label='Барометрическая высота', color='blue'))
                 if sel_data:
-                    times = [timestamp_to_utc(t) for t, v in sorted(sel_data)]
-                    values = [v for t, v in sorted(sel_data)]
-                    self.ax.step(times, values, where='post', label='Выбранная высота', color='red', linestyle='--')
+                    times, values = sel_data
+                    lines.append(self.mode_line(mode, 'selected', self.ax, times, values, drawstyle='steps-post', label='Выбранная высота', color='red', linestyle='--'))
         
         # блок отрисовки GNSS высоты (вычисляемой)
         elif mode == 'gnss_altitude':
@@ -168,152 +495,121 @@ class IcaoGraphs:
             baro_data = self.alt_dict.get(icao)
             title, label = f"GNSS Высота: {display_id}", "Высота (футы)"
             if not data:
-                self.ax.text(0.5, 0.5, f"Нет данных GNSS высоты для {icao}", 
-                             ha='center', va='center', transform=self.ax.transAxes)
+                message = f"Нет данных GNSS высоты для {icao}"
             else:
                 if baro_data:
-                    times_b = [timestamp_to_utc(t) for t, v in sorted(baro_data)]
-                    values_b = [v for t, v in sorted(baro_data)]
-                    self.ax.plot(times_b, values_b, '-', color='blue', alpha=0.3, label='Баро (спр.)')
-                
-                times = [timestamp_to_utc(t) for t, v in sorted(data)]
-                values = [v for t, v in sorted(data)]
-                self.ax.plot(times, values, 'o-', markersize=3, label='GNSS Высота', color='magenta')
+                    times_b, values_b = baro_data
+                    lines.append(self.mode_line(mode, 'baro', self.ax, times_b, values_b, '-', color='blue', alpha=0.3, label='Баро (спр.)'))
+
+                times, values = data
+                lines.append(self.mode_line(mode, 'gnss', self.ax, times, values, 'o-', markersize=3, label='GNSS Высота', color='magenta'))
 
         # блок отрисовки графика скорости
         elif mode == 'speed':
             data = self.spd_dict.get(icao)
             title, label = f"Скорость: {display_id}", "Скорость (узлы)"
             if not data:
-                self.ax.text(0.5, 0.5, f"Нет данных о скорости для борта {icao}", 
-                             ha='center', va='center', transform=self.ax.transAxes)
+                message = f"Нет данных о скорости для борта {icao}"
             else:
-                times = [timestamp_to_utc(t) for t, v in sorted(data)]
-                values = [v for t, v in sorted(data)]
-                self.ax.plot(times, values, 'o-', markersize=3, label='Скорость', color='green')
+                times, values = data
+                lines.append(self.mode_line(mode, 'speed', self.ax, times, values, 'o-', markersize=3, label='Скорость', color='green'))
 
         # блок отрисовки комбинированного графика
         elif mode == 'altitude_speed_combined':
             title = f"Высота и скорость: {display_id}"
             alt_data = self.alt_dict.get(icao)
             spd_data = self.spd_dict.get(icao)
+
+            # вторая ось создаётся один раз при входе в режим и живёт, пока он открыт
+            # (и для борта без данных: тогда она просто скрыта)
+            if self.ax2 is None:
+                self.ax2 = self.ax.twinx()
+                self.ax2.callbacks.connect('ylim_changed', self.on_limits_changed)
+                self.ax2.set_ylabel("Скорость (узлы)", color='green')
+                self.ax2.tick_params(axis='y', labelcolor='green')
             
             if not alt_data and not spd_data:
-                self.ax.text(0.5, 0.5, f"Нет данных о высоте и скорости для борта {icao}", 
-                             ha='center', va='center', transform=self.ax.transAxes)
+                message = f"Нет данных о высоте и скорости для борта {icao}"
             else:
-                self.ax.set_ylabel("Высота (футы)", color='blue')
-                self.ax.tick_params(axis='y', labelcolor='blue')
-                self.ax2 = self.ax.twinx() 
-                self.ax2.set_ylabel("Скорость (узлы)", color='green')
-                self.ax2.tick_params(axis='y', labelcolor='green')
-
-                lines1, labels1, lines2, labels2 = [], [], [], []
                 if alt_data:
-                    alt_times = [timestamp_to_utc(t) for t, v in sorted(alt_data)]
-                    alt_values = [v for t, v in sorted(alt_data)]
-                    line, = self.ax.plot(alt_times, alt_values, 'o-', markersize=3, label='Высота', color='blue')
-                    lines1.append(line)
-                    labels1.append('Высота')
+                    alt_times, alt_values = alt_data
+                    lines.append(self.mode_line(mode, 'altitude', self.ax, alt_times, alt_values, 'o-', markersize=3, label='Высота', color='blue'))
                 if spd_data:
-                    spd_times = [timestamp_to_utc(t) for t, v in sorted(spd_data)]
-                    spd_values = [v for t, v in sorted(spd_data)]
-                    line, = self.ax2.plot(spd_times, spd_values, 'o-', markersize=3, label='Скорость', color='green')
-                    lines2.append(line)
-                    labels2.append('Скорость')
-                
-                self.ax.legend(lines1 + lines2, labels1 + labels2, loc='upper left')
+                    spd_times, spd_values = spd_data
+                    lines2.append(self.mode_line(mode, 'speed', self.ax2, spd_times, spd_values, 'o-', markersize=3, label='Скорость', color='green'))
 
         # блок отрисовки графика широты
         elif mode == 'latitude':
             data = self.pos_dict.get(icao)
             title, label = f"Координаты: {display_id}", "Широта (°)"
-            if not data:
-                self.ax.text(0.5, 0.5, f"Нет данных о координатах для борта {icao}", 
-                             ha='center', va='center', transform=self.ax.transAxes)
+            if data is None:
+                message = f"Нет данных о координатах для борта {icao}"
             else:
-                times = [timestamp_to_utc(t) for t, lat, lon in data]
-                lats = [lat for t, lat, lon in data]
-                self.ax.plot(times, lats, 'o-', markersize=3, label='Широта', color='orange')
+                times = self.pos_times[icao]
+                lats = data[:, 1]
+                lines.append(self.mode_line(mode, 'latitude', self.ax, times, lats, 'o-', markersize=3, label='Широта', color='orange'))
 
         # блок отрисовки графика курса
         elif mode == 'course':
             data = self.course_dict.get(icao)
             title, label = f"Курс: {display_id}", "Курс (°)"
             if not data:
-                self.ax.text(0.5, 0.5, f"Нет данных о курсе для борта {icao}", 
-                             ha='center', va='center', transform=self.ax.transAxes)
+                message = f"Нет данных о курсе для борта {icao}"
             else:
-                times = [timestamp_to_utc(t) for t, v in sorted(data)]
-                values = [v for t, v in sorted(data)]
-                self.ax.plot(times, values, 'o-', markersize=3, label='Курс', color='purple')
+                times, values = data
+                lines.append(self.mode_line(mode, 'course', self.ax, times, values, 'o-', markersize=3, label='Курс', color='purple'))
 
         # блок отрисовки трека полёта (карты) для одного борта
         elif mode == 'track':
             data = self.pos_dict.get(icao)
             title = f"Схема трека полёта: {display_id}"
-            if not data:
-                self.ax.text(0.5, 0.5, f"Нет данных о координатах для борта {icao}", 
-                             ha='center', va='center', transform=self.ax.transAxes)
+            if data is None:
+                message = f"Нет данных о координатах для борта {icao}"
             else:
-                lons = [lon for t, lat, lon in data]
-                lats = [lat for t, lat, lon in data]
-                self.ax.plot(lons, lats, 'o', markersize=2, label='Трек')
+                lons = data[:, 2]
+                lats = data[:, 1]
+                lines.append(self.mode_line(mode, 'track', self.ax, lons, lats, 'o', markersize=2, label='Трек', color='C0'))
 
         # блок отрисовки разницы высот
         elif mode == 'altitude_diff':
             data = self.alt_diff_dict.get(icao)
             title, label = f"Разница высот (Выбранная - Baro): {display_id}", "Разница (футы)"
             if not data:
-                self.ax.text(0.5, 0.5, f"Нет данных о разнице высот для борта {icao}", 
-                             ha='center', va='center', transform=self.ax.transAxes)
+                message = f"Нет данных о разнице высот для борта {icao}"
             else:
-                times = [timestamp_to_utc(t) for t, v in sorted(data)]
-                values = [v for t, v in sorted(data)]
-                self.ax.plot(times, values, 'o-', markersize=3, label='Разница (GNSS - Baro)', color='red')
-                self.ax.axhline(y=0, color='gray', linestyle='--', alpha=0.7)
+                times, values = data
+                lines.append(self.mode_line(mode, 'diff', self.ax, times, values, 'o-', markersize=3, label='Разница (GNSS - Baro)', color='red'))
+                lines.append(self.mode_hline(mode, 'zero', 0, color='gray', linestyle='--', alpha=0.7))
 
         # блок отрисовки барокоррекции
         elif mode == 'baro_correction':
             data = self.baro_correction_dict.get(icao)
             title, label = f"Барокоррекция: {display_id}", "Давление (гПа)"
             if not data:
-                self.ax.text(0.5, 0.5, f"Нет данных о барокоррекции для борта {icao}", 
-                             ha='center', va='center', transform=self.ax.transAxes)
+                message = f"Нет данных о барокоррекции для борта {icao}"
             else:
-                times = [timestamp_to_utc(t) for t, v in sorted(data)]
-                values = [v for t, v in sorted(data)]
-                self.ax.plot(times, values, 'o-', markersize=3, label='Барокоррекция', color='brown')
-                self.ax.axhline(y=1013.25, color='green', linestyle='--', alpha=0.7, label='Стандартное давление (1013.25 гПа)')
+                times, values = data
+                lines.append(self.mode_line(mode, 'baro', self.ax, times, values, 'o-', markersize=3, label='Барокоррекция', color='brown'))
+                lines.append(self.mode_hline(mode, 'standard', 1013.25, color='green', linestyle='--', alpha=0.7, label='Стандартное давление (1013.25 гПа)'))
 
-        # установка заголовка и сетки
-        self.ax.set_title(title)
-        self.ax.grid(True, linestyle='--', alpha=0.7)
+        return title, label, lines, lines2, message
 
-        # настройка осей в зависимости от типа графика
-        if mode == 'track' or mode == 'all_tracks':
-            self.ax.set_aspect('equal', adjustable='datalim')
-            if mode == 'track':
-                 self.ax.set_xlabel("Долгота (°)")
-                 self.ax.set_ylabel("Широта (°)")
+    # функция возвращает общую серую линию треков всех бортов, прикреплённую к осям (строится один раз);
+    # треки склеиваются через NaN в одну линию
+    def get_all_tracks_line(self):
+        if self.all_tracks_line is None:
+            xs, ys = [], []
+            for track_icao, track_data in self.pos_dict.items():
+                # фильтрация треков на карте так же, как и список бортов
+                if track_icao not in self.icao_set: continue
+                xs += [track_data[:, 2], [np.nan]]
+                ys += [track_data[:, 1], [np.nan]]
+            if not xs:
+                xs = ys = [[np.nan]]
+            self.all_tracks_line, = self.ax.plot(np.concatenate(xs), np.concatenate(ys), '-', color='grey', linewidth=1, alpha=0.6, zorder=1)
         else:
-            self.ax.set_xlabel("Время (UTC)")
-            self.ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-            self.fig.autofmt_xdate(rotation=30)
-            if mode != 'altitude_speed_combined':
-                self.ax.set_ylabel(label)
-        
-        # отображение легенды
-        if self.ax.get_legend_handles_labels()[0] and mode != 'altitude_speed_combined':
-            self.ax.legend()
-
-        # применение масштабирования
-        if mode != 'altitude_speed_combined' and mode != 'all_tracks':
-            ylim = self.ylims[mode].get(icao, self.default_ylims.get(mode))
-            if ylim and ylim != 'auto':
-                self.ax.set_ylim(ylim)
-
-        self.fig.canvas.draw_idle()
+            self.ax.add_line(self.all_tracks_line)
+        return self.all_tracks_line
 
     # функция-обработчик для масштабирования колесом мыши
     def on_scroll(self, event):
@@ -345,27 +641,91 @@ class IcaoGraphs:
             new_height = (cur_ylim[1] - cur_ylim[0]) * scale_factor
             rel_y = (cur_ylim[1] - ydata) / (cur_ylim[1] - cur_ylim[0])
             self.ax.set_ylim([ydata - new_height * (1-rel_y), ydata + new_height * rel_y])
-        self.fig.canvas.draw_idle()
+        self.blit_axes()
+
+    # функция перерисовывает при масштабировании только оси графика (блиттинг):
+    # фон окна без осей один раз рисуется и запоминается, затем только восстанавливается.
+    # Рисуется вся ось целиком, а не только линии, потому что вместе с пределами меняются и метки
+    def blit_axes(self):
+        canvas = self.fig.canvas
+        if not canvas.supports_blit:
+            canvas.draw_idle()
+            return
+        axes = [ax for ax in (self.ax, self.ax2) if ax is not None and ax.get_visible()]
+        if self.scroll_background is None:
+            for ax in axes:
+                ax.set_visible(False)
+            canvas.draw()
+            self.scroll_background = canvas.copy_from_bbox(self.fig.bbox)
+            for ax in axes:
+                ax.set_visible(True)
+        else:
+            canvas.restore_region(self.scroll_background)
+        for ax in axes:
+            self.fig.draw_artist(ax)
+        canvas.blit(self.fig.bbox)
+
+    # функция сбрасывает фоны для блиттинга (вызывается после каждой полной перерисовки)
+    # и запоминает пределы осей только что нарисованного графика
+    def reset_backgrounds(self, event):
+        self.scroll_background = None
+        self.tracks_background = None
+        if self.shown_limits is None and self.shown_state is not None:
+            self.shown_limits = self.axes_limits()
+
+    # текущие пределы осей графика (вместе со второй осью y, если она есть)
+    def axes_limits(self):
+        limits = (self.ax.get_xlim(), self.ax.get_ylim())
+        if self.ax2 is not None:
+            limits += (self.ax2.get_ylim(),)
+        return limits
+
+    # функция-обработчик изменения пределов осей: пределы, отличные от нарисованных
+    # (масштабирование колесом или панелью инструментов), делают устаревшей общую карту,
+    # и при смене борта она рисуется заново; отрисовка того же графика тоже больше
+    # не пропускается и сбрасывает масштаб. Пока график перерисовывается полностью
+    # (пределы ещё не запомнены), изменения пределов не учитываются
+    def on_limits_changed(self, ax):
+        if self.shown_limits is None or self.axes_limits() == self.shown_limits:
+            return
+        self.shown_limits = None
+        self.tracks_view = False
+        self.tracks_background = None
+        self.shown_state = None
 
     # функции навигации по интерфейсу
     def next_icao(self, event=None):
         if not self.icao_list: return
         self.icao_index = (self.icao_index + 1) % len(self.icao_list)
-        self.plot_current()
+        self.schedule_redraw()
 
     def prev_icao(self, event=None):
         if not self.icao_list: return
         self.icao_index = (self.icao_index - 1 + len(self.icao_list)) % len(self.icao_list)
-        self.plot_current()
+        self.schedule_redraw()
 
     def next_mode(self, event=None):
         if not self.icao_list: return
         self.plot_mode_idx = (self.plot_mode_idx + 1) % len(self.plot_modes)
-        self.plot_current()
+        self.schedule_redraw()
 
     def prev_mode(self, event=None):
         if not self.icao_list: return
         self.plot_mode_idx = (self.plot_mode_idx - 1 + len(self.plot_modes)) % len(self.plot_modes)
+        self.schedule_redraw()
+
+    # перерисовка при навигации откладывается до простоя GUI: при автоповторе клавиш
+    # несколько нажатий подряд дают одну перерисовку последнего выбранного графика
+    def schedule_redraw(self):
+        if self.redraw_timer is None:
+            self.plot_current()
+            return
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            self.redraw_timer.start()
+
+    def do_redraw(self):
+        self.redraw_pending = False
         self.plot_current()
 
     def on_key(self, event):